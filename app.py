@@ -1,8 +1,19 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 import google.generativeai as genai
 import os
 import json
+import re
+import hashlib
+import time
+import threading
+import concurrent.futures
+from types import SimpleNamespace
+from typing import NamedTuple
+import orjson
+from diskcache import Cache
 
 # --- CONFIGURATION & SETUP ---
 st.set_page_config(
@@ -11,135 +22,466 @@ st.set_page_config(
     layout="wide"
 )
 
-# Load secrets from Streamlit's secret management
+BASE_URL = "https://api.planningcenteronline.com"
+
+# Transient 5xx errors are retried by the session adapter with short backoff
+# (at most ~2s in total, well inside _SEARCH_DEADLINE). Throttling (429, PCO allows
+# 100 req/20s) is not retried: its Retry-After can be far longer than a chat turn,
+# so it surfaces as a failed lookup and the partial result isn't cached.
+_RETRY = Retry(
+    total=3,
+    backoff_factor=0.3,
+    status_forcelist=(500, 502, 503, 504),
+    respect_retry_after_header=False,
+    allowed_methods=frozenset(["GET"]),
+    raise_on_status=False,
+)
+
+def _build_session(app_id, secret):
+    """Shared PCO session: keeps the TLS connection alive between calls. Pool is sized for the search_context fan-out."""
+    session = requests.Session()
+    session.auth = (app_id, secret)
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=_RETRY))
+    return session
+
+@st.cache_resource
+def _init():
+    """
+    One-time setup per process. Streamlit re-runs this script on every interaction,
+    so secrets and the PCO session are memoized here rather than rebuilt.
+    """
+    # Load secrets from Streamlit's secret management
+    pco_id = st.secrets["PCO_APPLICATION_ID"]
+    pco_secret = st.secrets["PCO_SECRET"]
+    return SimpleNamespace(
+        pco_id=pco_id,
+        pco_secret=pco_secret,
+        google_api_key=st.secrets["GOOGLE_API_KEY"],
+        session=_build_session(pco_id, pco_secret),
+    )
+
 try:
-    PCO_APP_ID = st.secrets["PCO_APPLICATION_ID"]
-    PCO_SECRET = st.secrets["PCO_SECRET"]
-    GOOGLE_API_KEY = st.secrets["GOOGLE_API_KEY"]
+    _CFG = _init()
 except Exception:
     st.error("❌ Missing API Keys. Please configure your secrets in Streamlit.")
     st.stop()
 
-# Configure Gemini
-genai.configure(api_key=GOOGLE_API_KEY)
-BASE_URL = "https://api.planningcenteronline.com"
-
 # --- HELPER FUNCTIONS ---
 
 def pco_api_call(endpoint, params=None):
     """Generic function to call PCO API securely."""
-    auth = (PCO_APP_ID, PCO_SECRET)
     try:
-        response = requests.get(f"{BASE_URL}{endpoint}", auth=auth, params=params, timeout=10)
+        response = _CFG.session.get(f"{BASE_URL}{endpoint}", params=params, timeout=10)
         return response
     except Exception as e:
         return None
 
+def _json(resp):
+    """Decode a PCO response body with orjson (C parser; much faster than stdlib json)."""
+    return orjson.loads(resp.content)
+
+@st.cache_resource
+def _disk_cache():
+    """On-disk tier under st.cache_data, so a restart doesn't start every lookup cold."""
+    return Cache(".pco_cache")
+
+def _disk_get(key):
+    """Disk-tier lookup. Any cache fault (sqlite, lock timeout, unwritable dir) counts as a miss."""
+    try:
+        return _disk_cache().get(key)
+    except Exception:
+        return None
+
+def _disk_set(key, data, expire):
+    """Disk-tier write. A cache fault just skips the write; the PCO result is still returned."""
+    try:
+        _disk_cache().set(key, data, expire=expire)
+    except Exception:
+        pass
+
+@st.cache_resource
+def _inflight():
+    """Requests currently on the wire, shared by every session: {key: Future}, guarded by the lock."""
+    return {}, threading.Lock()
+
+def _singleflight(key, fn):
+    """Run fn once for concurrent callers with the same key; the others wait for and share its result."""
+    inflight, lock = _inflight()
+    with lock:
+        future = inflight.get(key)
+        leader = future is None
+        if leader:
+            future = inflight[key] = concurrent.futures.Future()
+    if leader:
+        try:
+            future.set_result(fn())
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with lock:
+                inflight.pop(key, None)
+    return future.result()
+
+def pco_get_json(endpoint, params=None, disk_ttl=300):
+    """Calls PCO and returns the parsed JSON body. Raises on failure so cached callers never store an error."""
+    key = f"{endpoint}|{sorted((params or {}).items())}"
+    cached = _disk_get(key)
+    if cached is not None:
+        return cached
+
+    def fetch():
+        res = pco_api_call(endpoint, params)
+        if res is None:
+            raise requests.ConnectionError(f"No response from {endpoint}")
+        res.raise_for_status()
+        data = _json(res)
+        _disk_set(key, data, disk_ttl)
+        return data
+
+    # Double-submits and overlapping reruns share one HTTP call per identical request
+    return _singleflight(key, fetch)
+
+# Requests ask for only the attributes we read (JSON:API sparse fieldsets)
+# to keep payloads, parse time and cache entries small.
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def get_org_name():
+    """Organization name from the PCO root. Changes on the order of days, so cache it."""
+    org_data = pco_get_json("/", {"fields[Organization]": "name"}, disk_ttl=3600)
+    return org_data.get("data", {}).get("attributes", {}).get("name", "Unknown Org")
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def get_service_types():
+    """Gathering Types (PCO "Service Types"): the first 8 names plus the total count. Not query-dependent, so cached."""
+    body = pco_get_json("/services/v2/service_types", {"fields[ServiceType]": "name", "per_page": 8}, disk_ttl=3600)
+    data = body.get("data", [])
+    return {
+        "names": [s['attributes'].get('name', 'Unnamed') for s in data],
+        "total": body.get("meta", {}).get("total_count", len(data)),
+    }
+
+# Per-query lookups are cached briefly so follow-up questions about the same
+# person/event don't re-hit PCO. Callers pass the normalized query as the key.
+
+def _person_summary(record):
+    """Just the People attributes we use; the rest of the record (links, relationships) is dropped."""
+    attrs = record["attributes"]
+    return {"name": attrs.get("name"), "status": attrs.get("status")}
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _search_people(q):
+    """People matching q, retrying on the first word if nothing matched."""
+    result = {"people": [], "retry_term": None, "retry_people": []}
+    people = pco_get_json("/people/v2/people", {"where[search_name_or_email]": q, "per_page": 5, "fields[Person]": "name,status"}).get("data", [])
+    result["people"] = [_person_summary(p) for p in people]
+    if not people:
+        # RETRY: Try searching just the first word (a search fallback; network retries happen in the session)
+        first_word = q.split(' ')[0]
+        if len(first_word) > 2 and first_word != q:
+            result["retry_term"] = first_word
+            retry_data = pco_get_json("/people/v2/people", {"where[search_name_or_email]": first_word, "per_page": 2, "fields[Person]": "name,status"}).get("data", [])
+            result["retry_people"] = [_person_summary(p) for p in retry_data]
+    return result
+
+class _NameSearch(NamedTuple):
+    """A PCO module searched by record name."""
+    label: str
+    endpoint: str
+    resource_type: str  # JSON:API type, for the sparse fieldset
+    noun: str  # plural, for the debug log
+    prefix: str  # context line prefix
+    topics: frozenset  # classify() topics that route a query here
+
+_NAME_SEARCHES = (
+    _NameSearch("Calendar", "/calendar/v2/events", "Event", "events", "Found in Calendar",
+                frozenset({"event", "calendar", "when", "date", "gathering", "service"})),
+    _NameSearch("Groups", "/groups/v2/groups", "Group", "groups", "Found in Groups", frozenset({"group"})),
+)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _search_named(endpoint, resource_type, q):
+    """Names of records at endpoint whose name matches q."""
+    records = pco_get_json(endpoint, {"where[name]": q, "per_page": 3, f"fields[{resource_type}]": "name"}).get("data", [])
+    return [r['attributes'].get('name', 'Unnamed') for r in records]
+
+# One precompiled pass over the query instead of repeated substring scans.
+# Whole words plus plural/verb endings ("events", "donations"), so "eventually" and "groupme" don't hit.
+_CLASSIFIER = re.compile(
+    r"\b(event|gathering|service|group|calendar|when|date|giving|donat|how do i|how to)(?:s|e[sd]?|ions?)?\b", re.I
+)
+
+# A message that is nothing but a greeting or thanks ("Good morning!", "thanks all")
+_SMALL_TALK = re.compile(r"\W*(hi|hello|hey|good (morning|afternoon|evening)|thanks|thank you)( there| all| everyone)?\W*", re.I)
+
+# Topics PCO can't help with: giving data is private, how-to answers come from the
+# knowledge base, and small talk has nothing to look up. Anything else is searched.
+_NO_LOOKUP_TOPICS = {"giving", "donat", "how do i", "how to", "small talk"}
+
+def classify(q):
+    """Set of lowercased topic keywords found in the query, plus 'small talk' for a bare greeting or thanks."""
+    topics = {m.group(1).lower() for m in _CLASSIFIER.finditer(q)}
+    if _SMALL_TALK.fullmatch(q):
+        topics.add("small talk")
+    return topics
+
+# Upper bound on the whole PCO fan-out. Per-call timeouts plus retries could
+# otherwise hold a chat turn far longer; anything still running is reported as timed out.
+_SEARCH_DEADLINE = 12
+
+def _people_found(people_future, timeout):
+    """True if the People lookup matched anyone (exact or partial)."""
+    try:
+        result = people_future.result(timeout=timeout)
+    except (requests.RequestException, ValueError, concurrent.futures.TimeoutError, concurrent.futures.CancelledError):
+        return False
+    return bool(result["people"] or result["retry_people"])
+
+# Caps on the retrieved data that goes into every Gemini prompt
+_MAX_SECTION_CHARS = 512
+_MAX_CONTEXT_CHARS = 2048
+
+def _clip(text, limit):
+    """Truncate text to limit characters, marking the cut with '...'."""
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+def _format_people(people):
+    """'Name (Status), ...' for a list of People attribute dicts, joined without an intermediate list."""
+    return ", ".join(f"{p['name'] or 'Unknown'} ({p['status'] or 'Unknown'})" for p in people)
+
+@st.cache_resource
+def _pool():
+    """Long-lived worker pool for the PCO fan-out, so threads aren't created and joined every turn."""
+    return concurrent.futures.ThreadPoolExecutor(max_workers=6, thread_name_prefix="pco")
+
+class _PartialResult(Exception):
+    """Carries a search result that hit errors or timeouts, so st.cache_data doesn't keep it."""
+
+def _transient(exc):
+    """True if a lookup failure may clear up on a later turn. Other 4xx (e.g. a missing API scope) won't."""
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        status = exc.response.status_code
+        return status == 429 or status >= 500
+    return True
+
 def search_context(query):
     """
     Performs a 'federated search' across allowed PCO modules with CRASH PROTECTION.
+    Returns (context for the AI, debug log).
     """
+    # SHORT-CIRCUIT: don't touch PCO for questions that can't use its data
+    if classify(query) & _NO_LOOKUP_TOPICS:
+        return "No PCO lookup was needed for this question.", "⏭️ PCO search skipped: small talk, giving or how-to question."
+
+    # Normalized so "Alex" and " alex " share cache entries
+    clean_query = query.strip().lower()
+    try:
+        return _search_context(clean_query)
+    except _PartialResult as e:
+        return e.args[0]
+
+@st.cache_data(ttl=300, max_entries=256, show_spinner=False)
+def _search_context(clean_query):
+    """Cached body of search_context. Complete results are reused across turns and reruns."""
     context_data = []
     debug_log = []
-    
-    clean_query = query.strip()
+
+    # Fire all independent lookups at once; wall-clock cost is the slowest call, not the sum,
+    # capped at _SEARCH_DEADLINE. Parsing below stays serial so the debug log keeps its order.
+    topics = classify(clean_query)
+    deadline = time.monotonic() + _SEARCH_DEADLINE
+    ex = _pool()
+    org_future = ex.submit(get_org_name)
+    people_future = ex.submit(_search_people, clean_query)
+    services_future = ex.submit(get_service_types)
+    # ROUTING: topic words pick which of Calendar/Groups are worth searching;
+    # with no topic words, both are searched alongside People rather than after it
+    targeted = [search for search in _NAME_SEARCHES if topics & search.topics]
+    searched = targeted or list(_NAME_SEARCHES)
+    named_futures = [(search, ex.submit(_search_named, search.endpoint, search.resource_type, clean_query)) for search in searched]
+    # Don't block on stragglers past the deadline; their results are simply dropped,
+    # and any that never got a worker are cancelled so they don't hold up the next turn.
+    # Both cases are reported as timed out below.
+    done, pending = concurrent.futures.wait(
+        [org_future, people_future, services_future] + [f for _, f in named_futures],
+        timeout=max(0, deadline - time.monotonic()),
+    )
+    for future in pending:
+        future.cancel()
+    # SHORT-CIRCUIT: for a plain person question, Calendar/Groups results are dropped if People matched
+    if not targeted and _people_found(people_future, 0):
+        searched, named_futures = [], []
+    kept = [org_future, people_future, services_future] + [f for _, f in named_futures]
+    degraded = any(f in pending or (f.exception() and _transient(f.exception())) for f in kept)
 
     # 0. DIAGNOSTIC: Check which Organization we are connected to
     # CRASH FIX: Wrapped in try/except to handle non-JSON responses gracefully
-    org_res = pco_api_call("/")
-    if org_res and org_res.status_code == 200:
-        try:
-            org_data = org_res.json()
-            org_name = org_data.get("data", {}).get("attributes", {}).get("name", "Unknown Org")
-            debug_log.append(f"🏢 Connected to Organization: **{org_name}**")
-        except json.JSONDecodeError:
-            # If PCO returns HTML or empty text, don't crash. Just log it.
-            debug_log.append(f"⚠️ Org Check Failed: API returned invalid data. (Raw: {org_res.text[:50]}...)")
-    else:
+    try:
+        org_name = org_future.result(timeout=0)
+        debug_log.append(f"🏢 Connected to Organization: **{org_name}**")
+    except json.JSONDecodeError as e:
+        # If PCO returns HTML or empty text, don't crash. Just log it.
+        debug_log.append(f"⚠️ Org Check Failed: API returned invalid data. (Raw: {e.doc[:50]}...)")
+    except requests.RequestException:
         debug_log.append("❌ Org Check: Failed to connect to PCO Root.")
+    except (concurrent.futures.TimeoutError, concurrent.futures.CancelledError):
+        debug_log.append("❌ Org Check: Timed out.")
 
     # 1. Search PEOPLE (With Retry Logic)
-    res = pco_api_call("/people/v2/people", params={"where[search_name_or_email]": clean_query, "per_page": 5})
-    
     found_people = False
-    if res and res.status_code == 200:
-        try:
-            people = res.json().get("data", [])
-            if people:
+    try:
+        people_result = people_future.result(timeout=0)
+        people = people_result["people"]
+        if people:
+            found_people = True
+            debug_log.append(f"✅ People API: Found {len(people)} matches for '{clean_query}'")
+            context_data.append("Found in People Directory: " + _format_people(people))
+        else:
+            debug_log.append(f"⚠️ People API: 0 results for '{clean_query}'. Trying partial search...")
+            first_word = people_result["retry_term"]
+            retry_data = people_result["retry_people"]
+            if retry_data:
                 found_people = True
-                debug_log.append(f"✅ People API: Found {len(people)} matches for '{clean_query}'")
-                names = [f"{p['attributes'].get('name', 'Unknown')} ({p['attributes'].get('status', 'Unknown')})" for p in people]
-                context_data.append(f"Found in People Directory: {', '.join(names)}")
-            else:
-                debug_log.append(f"⚠️ People API: 0 results for '{clean_query}'. Trying partial search...")
-                
-                # RETRY: Try searching just the first word
-                first_word = clean_query.split(' ')[0]
-                if len(first_word) > 2 and first_word != clean_query:
-                    retry_res = pco_api_call("/people/v2/people", params={"where[search_name_or_email]": first_word, "per_page": 3})
-                    if retry_res and retry_res.status_code == 200:
-                        retry_data = retry_res.json().get("data", [])
-                        if retry_data:
-                            found_people = True
-                            debug_log.append(f"✅ People API: Retry found {len(retry_data)} matches for '{first_word}'")
-                            names = [f"{p['attributes'].get('name', 'Unknown')} ({p['attributes'].get('status', 'Unknown')})" for p in retry_data]
-                            context_data.append(f"No exact match, but found similar names: {', '.join(names)}")
-                        else:
-                            debug_log.append(f"❌ People API: Retry also found 0 records for '{first_word}'.")
-        except json.JSONDecodeError:
-            debug_log.append("❌ People API: Returned invalid JSON.")
-            
-    elif res and res.status_code == 403:
-        context_data.append("ERROR: Permission Denied to People Database.")
-        debug_log.append("❌ People API: 403 Forbidden (Check API Key 'People' Scope)")
+                debug_log.append(f"✅ People API: Retry found {len(retry_data)} matches for '{first_word}'")
+                context_data.append("No exact match, but found similar names: " + _format_people(retry_data))
+            elif first_word:
+                debug_log.append(f"❌ People API: Retry also found 0 records for '{first_word}'.")
+    except json.JSONDecodeError:
+        debug_log.append("❌ People API: Returned invalid JSON.")
+    except requests.HTTPError as e:
+        if e.response.status_code == 403:
+            context_data.append("ERROR: Permission Denied to People Database.")
+            debug_log.append("❌ People API: 403 Forbidden (Check API Key 'People' Scope)")
+        else:
+            debug_log.append(f"❌ People API: HTTP {e.response.status_code}")
+    except requests.RequestException:
+        pass
+    except (concurrent.futures.TimeoutError, concurrent.futures.CancelledError):
+        debug_log.append("❌ People API: Timed out.")
 
     # 2. Search SERVICES (Gatherings)
-    res = pco_api_call("/services/v2/service_types")
-    if res and res.status_code == 200:
-        try:
-            data = res.json().get("data", [])
-            debug_log.append(f"✅ Services API: Success. Found {len(data)} Gathering Types.")
-            # Only list names if we haven't found a person yet
-            types = [s['attributes'].get('name', 'Unnamed') for s in data[:8]]
-            context_data.append(f"Available Gathering Types: {', '.join(types)}")
-        except json.JSONDecodeError:
-            debug_log.append("❌ Services API: Returned invalid JSON.")
-    elif res and res.status_code == 403:
-        debug_log.append("❌ Services API: 403 Forbidden")
+    try:
+        service_types = services_future.result(timeout=0)
+        debug_log.append(f"✅ Services API: Success. Found {service_types['total']} Gathering Types.")
+        context_data.append("Available Gathering Types: " + ", ".join(service_types["names"]))
+    except json.JSONDecodeError:
+        debug_log.append("❌ Services API: Returned invalid JSON.")
+    except requests.HTTPError as e:
+        if e.response.status_code == 403:
+            debug_log.append("❌ Services API: 403 Forbidden")
+        else:
+            debug_log.append(f"❌ Services API: HTTP {e.response.status_code}")
+    except requests.RequestException:
+        pass
+    except (concurrent.futures.TimeoutError, concurrent.futures.CancelledError):
+        debug_log.append("❌ Services API: Timed out.")
 
-    # 3. Search CALENDAR
-    res = pco_api_call("/calendar/v2/events", params={"where[name]": clean_query, "per_page": 3})
-    if res and res.status_code == 200:
+    # 3-4. Search CALENDAR and GROUPS
+    for search in _NAME_SEARCHES:
+        if search not in searched:
+            reason = "not relevant to this query" if targeted else "People matched"
+            debug_log.append(f"⏭️ {search.label} API: Skipped ({reason}).")
+    for search, future in named_futures:
         try:
-            events = res.json().get("data", [])
-            if events:
-                debug_log.append(f"✅ Calendar API: Found {len(events)} events.")
-                event_names = [e['attributes'].get('name', 'Unnamed') for e in events]
-                context_data.append(f"Found in Calendar: {', '.join(event_names)}")
+            names = future.result(timeout=0)
+            if names:
+                debug_log.append(f"✅ {search.label} API: Found {len(names)} {search.noun}.")
+                context_data.append(f"{search.prefix}: {', '.join(names)}")
             else:
-                debug_log.append("✅ Calendar API: 0 events found.")
+                debug_log.append(f"✅ {search.label} API: 0 {search.noun} found.")
         except json.JSONDecodeError:
-            debug_log.append("❌ Calendar API: Returned invalid JSON.")
-
-    # 4. Search GROUPS
-    res = pco_api_call("/groups/v2/groups", params={"where[name]": clean_query, "per_page": 3})
-    if res and res.status_code == 200:
-        try:
-            groups = res.json().get("data", [])
-            if groups:
-                debug_log.append(f"✅ Groups API: Found {len(groups)} groups.")
-                group_names = [g['attributes'].get('name', 'Unnamed') for g in groups]
-                context_data.append(f"Found in Groups: {', '.join(group_names)}")
-        except json.JSONDecodeError:
-             debug_log.append("❌ Groups API: Returned invalid JSON.")
+            debug_log.append(f"❌ {search.label} API: Returned invalid JSON.")
+        except requests.HTTPError as e:
+            if e.response.status_code == 403:
+                debug_log.append(f"❌ {search.label} API: 403 Forbidden")
+            else:
+                debug_log.append(f"❌ {search.label} API: HTTP {e.response.status_code}")
+        except requests.RequestException:
+            pass
+        except (concurrent.futures.TimeoutError, concurrent.futures.CancelledError):
+            debug_log.append(f"❌ {search.label} API: Timed out.")
     
-    # Final Output Construction
-    final_output = "\n".join(context_data)
+    # Final Output Construction (capped so the Gemini prompt can't grow with the PCO data)
+    final_output = "\n".join(_clip(line, _MAX_SECTION_CHARS) for line in context_data)
+    final_output = _clip(final_output, _MAX_CONTEXT_CHARS)
     
     if not final_output:
         final_output = "No specific data found in People, Services, Calendar, or Groups for this query."
     
-    return final_output, "\n".join(debug_log)
+    result = (final_output, "\n".join(debug_log))
+    if degraded:
+        raise _PartialResult(result)
+    return result
+
+# --- PROMPT ---
+# Static part of the Gemini prompt, built once at import and set as the model's
+# system instruction. Kept terse: it is still billed as input tokens on every turn.
+_PCO_KNOWLEDGE_BASE = """PCO structure:
+- People: master member database. "Status" is usually Member, Regular Attender, or Visitor.
+- Gatherings: GO Church's name for liturgical services; the PCO "Services" module.
+- Calendar: master church calendar for room booking and public events.
+- Check-ins: Kids Ministry and attendance tracking.
+- Groups: small groups, Bible studies, home groups.
+Official support: https://support.planningcenteronline.com/hc/en-us"""
+
+_STATIC_PROMPT = f"""You are the "GO Church PCO Specialist", a helpful, friendly assistant for church staff. Help them find information in the GO Church PCO account and use PCO better.
+Terminology: PCO calls them "Services"; always call them "Gatherings" in your answer (e.g. "I found 3 upcoming Gatherings").
+{_PCO_KNOWLEDGE_BASE}
+Rules:
+1. If the answer is in DATA (real-time data from the GO Church account), quote it explicitly.
+2. For how-to questions, or when DATA lacks the exact answer, use your general Planning Center knowledge to explain the steps or where to look.
+3. A person found in Gatherings is likely scheduled to serve; in People, it is their profile.
+4. Never discuss giving, donations, or financial stats. If asked, say: "I do not have access to financial data."
+5. If you cannot answer, suggest searching the official PCO support site.""".strip()
+
+@st.cache_resource
+def get_executor():
+    """Background pool for running the PCO search alongside UI rendering."""
+    return concurrent.futures.ThreadPoolExecutor(max_workers=4)
+
+@st.cache_resource
+def get_model():
+    """Configures Gemini and builds the model handle, once per process; reused across chat turns."""
+    genai.configure(api_key=_CFG.google_api_key)
+    return genai.GenerativeModel('gemini-2.5-flash', system_instruction=_STATIC_PROMPT)
+
+# Answers keyed by (question, retrieved data). New PCO data means a new key,
+# so cached answers never outlive the data they were based on.
+_MAX_CACHED_RESPONSES = 256
+
+@st.cache_resource
+def get_response_cache():
+    """Process-wide store of Gemini answers, shared across sessions."""
+    return {}
+
+def response_cache_key(prompt, retrieved_info):
+    """SHA-256 of the question and the data it was answered from."""
+    payload = json.dumps({"p": prompt.strip(), "ctx": retrieved_info}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def remember_response(key, text):
+    """Store an answer, evicting the oldest once the cache is full."""
+    cache = get_response_cache()
+    if len(cache) >= _MAX_CACHED_RESPONSES:
+        cache.pop(next(iter(cache)), None)
+    cache[key] = text
+
+@st.cache_resource
+def _warm_pco():
+    """
+    Once per process, in the background: open the PCO connection (DNS + TLS) and
+    prime the cached org/Gathering Types lookups, so the first question doesn't pay for them.
+    """
+    def warm():
+        try:
+            # A real request on the shared session; the lookups below may be served from .pco_cache
+            _CFG.session.get(BASE_URL + "/people/v2", params={"per_page": 1}, timeout=5)
+            get_org_name()
+            get_service_types()
+        except Exception:
+            pass
+    threading.Thread(target=warm, daemon=True).start()
+
+_warm_pco()
 
 # --- USER INTERFACE ---
 
@@ -165,11 +507,28 @@ with st.sidebar:
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
-for message in st.session_state.messages:
+# Only the most recent messages are rendered on each rerun; older ones are drawn on request
+# and eventually pruned, so long sessions don't get slower with every keystroke.
+CHAT_WINDOW = 20
+MAX_HISTORY = 200
+
+if len(st.session_state.messages) > MAX_HISTORY:
+    st.session_state.messages = st.session_state.messages[-MAX_HISTORY:]
+
+earlier = st.session_state.messages[:-CHAT_WINDOW]
+if earlier and st.checkbox(f"Show earlier messages ({len(earlier)})", value=False, key="show_earlier"):
+    for message in earlier:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+for message in st.session_state.messages[-CHAT_WINDOW:]:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
 
 if prompt := st.chat_input("Ask a question about GO Church PCO..."):
+    # Start the PCO search right away so it runs while the chat UI renders
+    pco_future = get_executor().submit(search_context, prompt)
+
     # 1. User Message
     st.session_state.messages.append({"role": "user", "content": prompt})
     with st.chat_message("user"):
@@ -181,7 +540,7 @@ if prompt := st.chat_input("Ask a question about GO Church PCO..."):
         message_placeholder.markdown("🔍 *Searching PCO Database...*")
         
         # A. Fetch Real Data with Diagnostics
-        retrieved_info, debug_info = search_context(prompt)
+        retrieved_info, debug_info = pco_future.result()
         
         # Show debug if requested
         if show_debug:
@@ -189,54 +548,23 @@ if prompt := st.chat_input("Ask a question about GO Church PCO..."):
             st.text(f"Raw Context Sent to AI:\n{retrieved_info}")
         
         # B. AI Synthesis
-        # Updated Model to 2.5 Flash
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        
-        # Knowledge Base Injection
-        pco_knowledge_base = """
-        PCO STRUCTURE & CONTEXT:
-        - **People:** The master database of members. "Status" usually refers to Member, Regular Attender, or Visitor.
-        - **Gatherings (PCO "Services"):** GO Church calls liturgical services "Gatherings". In the API, this is the "Services" module.
-        - **Calendar:** The master church calendar for room booking and public events.
-        - **Check-ins:** Used primarily for Kids Ministry and attendance tracking.
-        - **Groups:** Small groups, Bible studies, and home groups.
-        
-        OFFICIAL SUPPORT RESOURCE:
-        If the API data is insufficient, refer the user to: https://support.planningcenteronline.com/hc/en-us
-        """
-
-        system_prompt = f"""
-        You are the "GO Church PCO Specialist"—a helpful, friendly AI assistant for church staff.
-        
-        YOUR GOAL:
-        Help staff find information in the GO Church PCO account and understand how to use PCO better.
-
-        TERMINOLOGY RULE:
-        - **"Gatherings" vs "Services":** The PCO database calls them "Services", but GO Church calls them "Gatherings". 
-        - If the user asks a specific question and you cannot find the exact answer in the Retrieved Data, use your general knowledge of how Planning Center works to explain WHERE they should look.
-        - In your output, ALWAYS refer to them as "Gatherings" (e.g., "I found 3 upcoming Gatherings...").
-
-        CONTEXT:
-        {pco_knowledge_base}
+        model = get_model()
         
-        REAL-TIME DATA FROM GO CHURCH ACCOUNT:
-        ---
-        {retrieved_info}
-        ---
+        user_prompt = "DATA:\n" + retrieved_info + "\n\nQ: " + prompt
         
-        INSTRUCTIONS:
-        1. **Prioritize Real Data:** If the answer is in the "REAL-TIME DATA" section above, quote it explicitly.
-        2. **Fill the Gaps:** If the user asks a "How-to" question (e.g., "How do I add a song?"), rely on your general knowledge of Planning Center Online to explain the steps.
-        3. **Contextualize:** If looking for "John," understand that if he is in "Gatherings," he is likely scheduled to serve; if in "People," it's his profile.
-        4. **Giving Firewall:** NEVER discuss giving, donations, or financial stats. If asked, state: "I do not have access to financial data."
-        5. **Support Link:** If you cannot answer, suggest they search the official PCO support site.
-
-        User Question: {prompt}
-        """
+        cache_key = response_cache_key(prompt, retrieved_info)
         
         try:
-            response = model.generate_content(system_prompt)
-            full_response = response.text
+            full_response = get_response_cache().get(cache_key)
+            if full_response is None:
+                # Stream so the answer starts rendering at the first chunk instead of after the whole reply
+                stream = model.generate_content(user_prompt, stream=True)
+                buf = []
+                for chunk in stream:
+                    buf.append(chunk.text)
+                    message_placeholder.markdown("".join(buf) + " ▌")
+                full_response = "".join(buf)
+                remember_response(cache_key, full_response)
             message_placeholder.markdown(full_response)
             st.session_state.messages.append({"role": "assistant", "content": full_response})
         except Exception as e: